@@ -5,12 +5,144 @@ import sys
 import socket
 import os
 import json
+import time
 import subprocess
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import pandas as pd
 import csv
 
-app = FastAPI()
+# 並列数・キュー長・タイムアウト設定（環境変数で上書き可能）
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", "4"))  # CSV走査用スレッド数（/book-info と /wordcloud で共用）
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "8"))  # 楽天API呼び出し用スレッド数
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "5"))  # 楽天APIの接続・読み込み毎のタイムアウト兼、応答本文読み込み全体の期限（秒）
+RETRY_AFTER = int(os.getenv("RETRY_AFTER", "2"))  # 503応答のRetry-After（秒）
+
+class ConcurrencyLimiter:
+    """エンドポイント毎の同時実行数・待ち行列長・処理期限を制御する"""
+
+    def __init__(self, max_concurrency: int, max_queue: int, timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = 0
+
+    async def run(self, func, *args):
+        # 実行中＋待機中が上限に達していれば即座に503で断る（負荷制限）
+        if self._pending >= self.max_concurrency + self.max_queue:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy",
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+        self._pending += 1
+        try:
+            # 待ち時間も含めてリクエスト全体に期限を設ける
+            async with asyncio.timeout(self.timeout) as deadline:
+                async with self._semaphore:
+                    return await func(*args)
+        except TimeoutError:
+            # 処理内部のTimeoutError（ソケットタイムアウト等）は期限切れとして扱わない
+            if deadline.expired():
+                raise HTTPException(status_code=504, detail="Request timed out")
+            raise
+        finally:
+            self._pending -= 1
+
+def limiter_from_env(name: str, max_concurrency: int, max_queue: int, timeout: float, limit: int | None = None) -> ConcurrencyLimiter:
+    """環境変数（例: SEARCH_MAX_CONCURRENCY, SEARCH_MAX_QUEUE, SEARCH_TIMEOUT）で設定を上書きする"""
+    concurrency = int(os.getenv(f"{name}_MAX_CONCURRENCY", str(max_concurrency)))
+    if limit is not None:
+        # 供給先プールのスレッド数を超えると、プール内部で待たされて期限を使い切る
+        concurrency = min(concurrency, limit)
+    return ConcurrencyLimiter(
+        max_concurrency=concurrency,
+        max_queue=int(os.getenv(f"{name}_MAX_QUEUE", str(max_queue))),
+        timeout=float(os.getenv(f"{name}_TIMEOUT", str(timeout))),
+    )
+
+# MeCab解析のサブプロセスは1リクエストにつき同時に1つなので、
+# サブプロセス数の上限は SEARCH + KEYWORDS + WORDCLOUD の同時実行数の合計になる。
+# エンドポイント間で枠を共有しないため、/wordcloud が混んでも /search は待たされない。
+book_info_limiter = limiter_from_env("BOOK_INFO", 2, 16, 5, limit=CPU_POOL_SIZE)
+rakuten_limiter = limiter_from_env("RAKUTEN", 8, 32, 10, limit=IO_POOL_SIZE)
+wordcloud_limiter = limiter_from_env("WORDCLOUD", 2, 4, 30, limit=CPU_POOL_SIZE)
+search_limiter = limiter_from_env("SEARCH", 2, 8, 15)
+keywords_limiter = limiter_from_env("KEYWORDS", 2, 8, 15)
+
+class BoundedPool:
+    """空きスレッドがあるときだけ投入するスレッドプール（実行器内部の無制限キューに積まない）"""
+
+    def __init__(self, size: int, name: str):
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(size)
+
+    async def run(self, func, *args):
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # 期限切れでリクエストが打ち切られても、スレッドが実際に空くまで枠を返さない
+        future.add_done_callback(lambda _: self._release_from_thread(loop))
+        return await asyncio.wrap_future(future)
+
+    def _release_from_thread(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._slots.release)
+        except RuntimeError:
+            pass  # イベントループ終了後
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+cpu_pool = BoundedPool(CPU_POOL_SIZE, "cpu")
+io_pool = BoundedPool(IO_POOL_SIZE, "io")
+running_processes: set[asyncio.subprocess.Process] = set()
+
+async def run_script(args: list[str], input: str | None = None, cwd: str = "/app") -> subprocess.CompletedProcess:
+    """Pythonスクリプトを非同期サブプロセスで実行する（期限切れ時はプロセスを終了）"""
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+    )
+    running_processes.add(proc)
+    try:
+        stdout, stderr = await proc.communicate(input.encode() if input is not None else None)
+    except asyncio.CancelledError:
+        kill_process(proc)
+        await proc.wait()
+        raise
+    finally:
+        running_processes.discard(proc)
+    return subprocess.CompletedProcess(args, proc.returncode, stdout.decode(), stderr.decode())
+
+def kill_process(proc: asyncio.subprocess.Process):
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        pass
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 終了時に実行中の解析プロセスとスレッドプールを片付ける
+    procs = list(running_processes)
+    for proc in procs:
+        kill_process(proc)
+    await asyncio.gather(*(proc.wait() for proc in procs))
+    cpu_pool.shutdown()
+    io_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS設定
 app.add_middleware(
@@ -46,8 +178,11 @@ def health():
     return {"status": "ok"}
 
 @app.get("/book-info")
-def book_info(isbn: str = Query(...), type: str = Query(None)):
+async def book_info(isbn: str = Query(...), type: str = Query(None)):
     """書籍情報を取得（CSVから）"""
+    return await book_info_limiter.run(cpu_pool.run, lookup_book_info, isbn, type)
+
+def lookup_book_info(isbn: str, type: str | None):
     try:
         csv_path = os.path.join("public", "database.csv")
         if not os.path.exists(csv_path):
@@ -106,19 +241,38 @@ def book_info(isbn: str = Query(...), type: str = Query(None)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/rakuten-cache")
-def rakuten_cache_endpoint(isbn: str = Query(...)):
+async def rakuten_cache_endpoint(isbn: str = Query(...)):
     """楽天APIキャッシュ（24時間キャッシュ）"""
+    normalized_isbn = normalize_isbn(isbn)
+    if not normalized_isbn:
+        raise HTTPException(status_code=400, detail="無効なISBN形式")
+    
+    # キャッシュチェック（上流I/Oが不要なので負荷制限を通さない）
+    if normalized_isbn in rakuten_cache:
+        cached = rakuten_cache[normalized_isbn]
+        if datetime.now().timestamp() * 1000 - cached['timestamp'] < CACHE_DURATION:
+            return {**cached['data'], "cached": True}
+    
+    return await rakuten_limiter.run(fetch_rakuten_info, normalized_isbn)
+
+def fetch_rakuten_json(api_url: str) -> tuple[int, dict | None]:
+    """楽天APIを呼び出す（io_poolで実行）"""
+    import urllib.request
+    
+    # timeoutは接続・読み込み1回毎の上限なので、少しずつ送ってくる相手に備えて全体の期限も見る
+    deadline = time.monotonic() + UPSTREAM_TIMEOUT
+    with urllib.request.urlopen(api_url, timeout=UPSTREAM_TIMEOUT) as response:
+        if response.getcode() == 429:
+            return 429, None
+        chunks = []
+        while chunk := response.read1(8192):
+            if time.monotonic() > deadline:
+                raise TimeoutError("楽天APIの応答が時間内に完了しませんでした")
+            chunks.append(chunk)
+        return response.getcode(), json.loads(b"".join(chunks).decode())
+
+async def fetch_rakuten_info(normalized_isbn: str):
     try:
-        normalized_isbn = normalize_isbn(isbn)
-        if not normalized_isbn:
-            raise HTTPException(status_code=400, detail="無効なISBN形式")
-        
-        # キャッシュチェック
-        if normalized_isbn in rakuten_cache:
-            cached = rakuten_cache[normalized_isbn]
-            if datetime.now().timestamp() * 1000 - cached['timestamp'] < CACHE_DURATION:
-                return {**cached['data'], "cached": True}
-        
         # 楽天APIから取得
         rakuten_app_id = os.getenv("RAKUTEN_APP_ID")
         if not rakuten_app_id:
@@ -139,65 +293,62 @@ def rakuten_cache_endpoint(isbn: str = Query(...)):
         affiliate_id = "49bc895f.748bd82f.49bc8960.04343aac"
         api_url = f"https://app.rakuten.co.jp/services/api/BooksBook/Search/20170404?applicationId={rakuten_app_id}&isbn={normalized_isbn}&affiliateId={affiliate_id}&format=json"
         
-        import urllib.request
         import urllib.error
         
         try:
-            with urllib.request.urlopen(api_url) as response:
-                if response.getcode() == 429:
-                    result = {
-                        "title": None,
-                        "author": None,
-                        "publisher": None,
-                        "publicationDate": None,
-                        "price": None,
-                        "imageUrl": None,
-                        "description": None,
-                        "itemUrl": None,
-                        "affiliateUrl": None,
-                        "cached": False,
-                        "error": "API制限"
-                    }
-                else:
-                    data = json.loads(response.read().decode())
+            status, data = await io_pool.run(fetch_rakuten_json, api_url)
+            if status == 429:
+                result = {
+                    "title": None,
+                    "author": None,
+                    "publisher": None,
+                    "publicationDate": None,
+                    "price": None,
+                    "imageUrl": None,
+                    "description": None,
+                    "itemUrl": None,
+                    "affiliateUrl": None,
+                    "cached": False,
+                    "error": "API制限"
+                }
+            else:
+                result = {
+                    "title": None,
+                    "author": None,
+                    "publisher": None,
+                    "publicationDate": None,
+                    "price": None,
+                    "imageUrl": None,
+                    "description": None,
+                    "itemUrl": None,
+                    "affiliateUrl": None,
+                    "cached": False
+                }
+                
+                if data.get("Items") and len(data["Items"]) > 0:
+                    item = data["Items"][0]["Item"]
+                    image_url = item.get("largeImageUrl") or item.get("mediumImageUrl") or item.get("smallImageUrl") or None
                     
                     result = {
-                        "title": None,
-                        "author": None,
-                        "publisher": None,
-                        "publicationDate": None,
-                        "price": None,
-                        "imageUrl": None,
-                        "description": None,
-                        "itemUrl": None,
-                        "affiliateUrl": None,
+                        "title": item.get("title") or None,
+                        "author": item.get("author") or None,
+                        "publisher": item.get("publisherName") or None,
+                        "publicationDate": item.get("salesDate") or None,
+                        "price": item.get("itemPrice") or None,
+                        "imageUrl": image_url,
+                        "description": item.get("itemCaption") or None,
+                        "itemUrl": item.get("itemUrl") or None,
+                        "affiliateUrl": item.get("affiliateUrl") or None,
                         "cached": False
                     }
-                    
-                    if data.get("Items") and len(data["Items"]) > 0:
-                        item = data["Items"][0]["Item"]
-                        image_url = item.get("largeImageUrl") or item.get("mediumImageUrl") or item.get("smallImageUrl") or None
-                        
-                        result = {
-                            "title": item.get("title") or None,
-                            "author": item.get("author") or None,
-                            "publisher": item.get("publisherName") or None,
-                            "publicationDate": item.get("salesDate") or None,
-                            "price": item.get("itemPrice") or None,
-                            "imageUrl": image_url,
-                            "description": item.get("itemCaption") or None,
-                            "itemUrl": item.get("itemUrl") or None,
-                            "affiliateUrl": item.get("affiliateUrl") or None,
-                            "cached": False
-                        }
-                
-                # キャッシュに保存
-                rakuten_cache[normalized_isbn] = {
-                    "data": result,
-                    "timestamp": datetime.now().timestamp() * 1000
-                }
-                
-                return result
+            
+            # キャッシュに保存
+            rakuten_cache[normalized_isbn] = {
+                "data": result,
+                "timestamp": datetime.now().timestamp() * 1000
+            }
+            
+            return result
         except urllib.error.HTTPError as e:
             if e.code == 429:
                 result = {
@@ -244,9 +395,24 @@ def rakuten_cache_endpoint(isbn: str = Query(...)):
             "error": str(e)
         }
 
+def read_records(csv_path: str) -> list[dict]:
+    """CSVを読み込む（cpu_poolで実行）"""
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def read_word_set(path: str) -> set[str]:
+    """1行1語の単語リストを読み込む（cpu_poolで実行）"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return set(line.strip() for line in f if line.strip())
+
 @app.get("/wordcloud")
-def wordcloud(isbn: str = Query(...)):
+async def wordcloud(isbn: str = Query(...)):
     """ワードクラウド生成"""
+    return await wordcloud_limiter.run(build_wordcloud, isbn)
+
+async def build_wordcloud(isbn: str):
     try:
         csv_path = os.path.join("public", "database.csv")
         abstract_words_path = os.path.join("public", "abstractwords.txt")
@@ -256,14 +422,12 @@ def wordcloud(isbn: str = Query(...)):
             raise HTTPException(status_code=500, detail="Database file not found")
         
         # CSVから書籍情報を取得
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            book_record = None
-            records = list(reader)
-            for record in records:
-                if record.get('ISBN') == isbn:
-                    book_record = record
-                    break
+        records = await cpu_pool.run(read_records, csv_path)
+        book_record = None
+        for record in records:
+            if record.get('ISBN') == isbn:
+                book_record = record
+                break
         
         if not book_record or not book_record.get('review'):
             return {"words": []}
@@ -272,23 +436,11 @@ def wordcloud(isbn: str = Query(...)):
         genre = book_record.get('genre')
         
         # 抽象語とストップワードを読み込み
-        abstract_words = set()
-        if os.path.exists(abstract_words_path):
-            with open(abstract_words_path, 'r', encoding='utf-8') as f:
-                abstract_words = set(line.strip() for line in f if line.strip())
-        
-        stop_words = set()
-        if os.path.exists(stop_words_path):
-            with open(stop_words_path, 'r', encoding='utf-8') as f:
-                stop_words = set(line.strip() for line in f if line.strip())
+        abstract_words = await cpu_pool.run(read_word_set, abstract_words_path)
+        stop_words = await cpu_pool.run(read_word_set, stop_words_path)
         
         # search_engine.pyでレビューからキーワード抽出
-        result = subprocess.run(
-            ["python3", "search_engine.py", review],
-            capture_output=True,
-            text=True,
-            cwd="/app"
-        )
+        result = await run_script(["python3", "search_engine.py", review])
         
         if result.returncode != 0:
             return {"words": []}
@@ -310,19 +462,14 @@ def wordcloud(isbn: str = Query(...)):
         for book in same_genre_books:
             if book.get('review'):
                 try:
-                    genre_result = subprocess.run(
-                        ["python3", "search_engine.py", book.get('review')],
-                        capture_output=True,
-                        text=True,
-                        cwd="/app"
-                    )
+                    genre_result = await run_script(["python3", "search_engine.py", book.get('review')])
                     if genre_result.returncode == 0:
                         genre_search = json.loads(genre_result.stdout)
                         if genre_search.get("results"):
                             for b in genre_search["results"]:
                                 if b.get("keywords"):
                                     all_keywords.extend(b["keywords"])
-                except:
+                except Exception:
                     continue
         
         # 単語の出現頻度をカウント
@@ -341,15 +488,13 @@ def wordcloud(isbn: str = Query(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/search")
-def search(request: SearchRequest):
+async def search(request: SearchRequest):
     """書籍検索"""
+    return await search_limiter.run(run_search, request.query)
+
+async def run_search(query: str):
     try:
-        result = subprocess.run(
-            ["python3", "search_engine.py", request.query],
-            capture_output=True,
-            text=True,
-            cwd="/app"
-        )
+        result = await run_script(["python3", "search_engine.py", query])
         
         if result.returncode != 0:
             raise HTTPException(status_code=500, detail=f"Search failed: {result.stderr}")
@@ -359,15 +504,13 @@ def search(request: SearchRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/keywords")
-def get_keywords():
+async def get_keywords():
     """キーワード一覧を取得（TOPページの候補リスト用）"""
+    return await keywords_limiter.run(list_keywords)
+
+async def list_keywords():
     try:
-        result = subprocess.run(
-            ["python3", "extract_keywords.py"],
-            capture_output=True,
-            text=True,
-            cwd="/app"
-        )
+        result = await run_script(["python3", "extract_keywords.py"])
         
         if result.returncode != 0:
             raise HTTPException(status_code=500, detail=f"Keywords extraction failed: {result.stderr}")
@@ -379,16 +522,13 @@ def get_keywords():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/keywords")
-def extract_keywords(request: KeywordsRequest):
+async def extract_keywords(request: KeywordsRequest):
     """テキストからキーワード抽出（既存のエンドポイント）"""
+    return await keywords_limiter.run(extract_text_keywords, request.text)
+
+async def extract_text_keywords(text: str):
     try:
-        result = subprocess.run(
-            ["python3", "extract_keywords.py"],
-            input=request.text,
-            capture_output=True,
-            text=True,
-            cwd="/app"
-        )
+        result = await run_script(["python3", "extract_keywords.py"], input=text)
         
         if result.returncode != 0:
             raise HTTPException(status_code=500, detail=f"Keywords extraction failed: {result.stderr}")
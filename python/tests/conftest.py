@@ -0,0 +1,64 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+# app.py は uvicorn app:app で python/ から起動される前提のモジュール
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as api  # noqa: E402
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+SCRIPT_LATENCY = 0.1  # 解析スクリプト（search_engine.py等）の擬似処理時間（秒）
+UPSTREAM_LATENCY = 0.05  # 楽天APIの擬似応答時間（秒）
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def stub_backends(monkeypatch):
+    """解析スクリプトと楽天APIを固定遅延の偽物に差し替え、制限値をテスト用に作り直す"""
+    latency = {"script": SCRIPT_LATENCY, "upstream": UPSTREAM_LATENCY}
+
+    async def fake_run_script(args, input=None, cwd="/app"):
+        await asyncio.sleep(latency["script"])
+        stdout = json.dumps({"results": [{"keywords": ["怖い", "美しい"]}]})
+        return subprocess.CompletedProcess(args, 0, stdout, "")
+
+    def fake_fetch_rakuten_json(api_url):
+        time.sleep(latency["upstream"])
+        return 200, {"Items": []}
+
+    monkeypatch.setattr(api, "run_script", fake_run_script)
+    monkeypatch.setattr(api, "fetch_rakuten_json", fake_fetch_rakuten_json)
+    monkeypatch.setattr(api, "rakuten_cache", {})
+    monkeypatch.setenv("RAKUTEN_APP_ID", "test-app-id")
+    monkeypatch.chdir(REPO_ROOT)
+
+    # セマフォはイベントループに結び付くため、テスト毎に新しく作る
+    monkeypatch.setattr(api, "cpu_pool", api.BoundedPool(4, "test-cpu"))
+    monkeypatch.setattr(api, "io_pool", api.BoundedPool(4, "test-io"))
+    monkeypatch.setattr(api, "book_info_limiter", api.ConcurrencyLimiter(2, 8, 5))
+    monkeypatch.setattr(api, "rakuten_limiter", api.ConcurrencyLimiter(4, 8, 5))
+    monkeypatch.setattr(api, "wordcloud_limiter", api.ConcurrencyLimiter(2, 4, 5))
+    monkeypatch.setattr(api, "search_limiter", api.ConcurrencyLimiter(2, 8, 5))
+    monkeypatch.setattr(api, "keywords_limiter", api.ConcurrencyLimiter(2, 8, 5))
+    yield latency
+    api.cpu_pool.shutdown()
+    api.io_pool.shutdown()
+
+
+@pytest.fixture
+async def client(stub_backends):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
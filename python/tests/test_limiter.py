@@ -0,0 +1,122 @@
+import asyncio
+import os
+import socket
+import sys
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+import app as api
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_sheds_beyond_concurrency_plus_queue():
+    limiter = api.ConcurrencyLimiter(max_concurrency=1, max_queue=2, timeout=5)
+    release = asyncio.Event()
+
+    async def hold():
+        await release.wait()
+        return "done"
+
+    tasks = [asyncio.create_task(limiter.run(hold)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert limiter._pending == 3
+
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.run(hold)
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == str(api.RETRY_AFTER)
+
+    release.set()
+    assert await asyncio.gather(*tasks) == ["done"] * 3
+    assert limiter._pending == 0
+
+
+async def test_pending_released_after_error():
+    limiter = api.ConcurrencyLimiter(max_concurrency=1, max_queue=0, timeout=5)
+
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await limiter.run(fail)
+    assert limiter._pending == 0
+
+
+async def test_pending_released_after_timeout():
+    limiter = api.ConcurrencyLimiter(max_concurrency=1, max_queue=0, timeout=0.05)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.run(asyncio.sleep, 1)
+    assert exc_info.value.status_code == 504
+    assert limiter._pending == 0
+
+
+async def test_timeout_covers_time_spent_queued():
+    limiter = api.ConcurrencyLimiter(max_concurrency=1, max_queue=1, timeout=0.2)
+    blocker = asyncio.create_task(limiter.run(asyncio.sleep, 0.5))
+    await asyncio.sleep(0)
+
+    async def quick():
+        return "ok"
+
+    # 処理自体は一瞬だが、先行リクエストの後ろで期限を使い切る
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.run(quick)
+    assert exc_info.value.status_code == 504
+
+    with pytest.raises(HTTPException):
+        await blocker
+    assert limiter._pending == 0
+
+
+async def test_inner_timeout_error_is_not_a_deadline():
+    limiter = api.ConcurrencyLimiter(max_concurrency=1, max_queue=0, timeout=5)
+
+    async def upstream_timeout():
+        raise socket.timeout("read timed out")
+
+    with pytest.raises(TimeoutError):
+        await limiter.run(upstream_timeout)
+    assert limiter._pending == 0
+
+
+async def test_deadline_kills_and_reaps_subprocess(tmp_path):
+    limiter = api.ConcurrencyLimiter(max_concurrency=1, max_queue=0, timeout=0.2)
+    args = [sys.executable, "-c", "import time; time.sleep(5)"]
+    task = asyncio.create_task(limiter.run(api.run_script, args, None, str(tmp_path)))
+
+    while not api.running_processes:
+        await asyncio.sleep(0.01)
+    pid = next(iter(api.running_processes)).pid
+
+    with pytest.raises(HTTPException) as exc_info:
+        await task
+    assert exc_info.value.status_code == 504
+    assert not api.running_processes
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+
+async def test_bounded_pool_holds_slot_until_abandoned_thread_finishes():
+    pool = api.BoundedPool(1, "test")
+    release = threading.Event()
+    try:
+        abandoned = asyncio.create_task(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        abandoned.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await abandoned
+
+        # 打ち切られた処理のスレッドが動いている間は次の処理を投入しない
+        follower = asyncio.create_task(pool.run(lambda: "ok"))
+        await asyncio.sleep(0.1)
+        assert not follower.done()
+
+        release.set()
+        assert await asyncio.wait_for(follower, 1) == "ok"
+    finally:
+        release.set()
+        pool.shutdown()
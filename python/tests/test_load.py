@@ -0,0 +1,152 @@
+"""ASGIアプリに過負荷をかけ、負荷制限・期限・p99レイテンシを確認する負荷試験
+
+    python -m pytest -q python/tests/test_load.py
+"""
+import asyncio
+import math
+import time
+
+import pytest
+
+import app as api
+from conftest import SCRIPT_LATENCY
+
+pytestmark = pytest.mark.anyio
+
+OVERLOAD_REQUESTS = 100
+P99_BOUND = 1.0  # 受け付けたリクエストのp99上限（秒）
+WORDCLOUD_ISBN = "9784047375840"
+
+
+def p99(latencies: list[float]) -> float:
+    """nearest-rank方式のp99（標本が100未満なら最大値になる）"""
+    ordered = sorted(latencies)
+    return ordered[math.ceil(0.99 * len(ordered)) - 1]
+
+
+async def timed(client, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    return response, time.perf_counter() - start
+
+
+async def test_search_overload_sheds_excess_and_bounds_p99(client):
+    limiter = api.search_limiter
+    capacity = limiter.max_concurrency + limiter.max_queue
+
+    results = await asyncio.gather(*[
+        timed(client, "POST", "/search", json={"query": "怖い"})
+        for _ in range(OVERLOAD_REQUESTS)
+    ])
+
+    accepted = [latency for response, latency in results if response.status_code == 200]
+    shed = [response for response, _ in results if response.status_code == 503]
+    assert len(accepted) == capacity
+    assert len(shed) == OVERLOAD_REQUESTS - capacity
+    assert all(response.headers["Retry-After"] == str(api.RETRY_AFTER) for response in shed)
+    assert p99(accepted) < P99_BOUND
+
+
+async def test_rakuten_overload_sheds_excess_and_bounds_p99(client):
+    limiter = api.rakuten_limiter
+    capacity = limiter.max_concurrency + limiter.max_queue
+
+    results = await asyncio.gather(*[
+        timed(client, "GET", f"/rakuten-cache?isbn=978{i:010d}")
+        for i in range(OVERLOAD_REQUESTS)
+    ])
+
+    accepted = [latency for response, latency in results if response.status_code == 200]
+    shed = [response for response, _ in results if response.status_code == 503]
+    assert len(accepted) == capacity
+    assert len(shed) == OVERLOAD_REQUESTS - capacity
+    assert all("Retry-After" in response.headers for response in shed)
+    assert p99(accepted) < P99_BOUND
+
+
+async def test_expired_deadline_returns_504(client, stub_backends, monkeypatch):
+    stub_backends["script"] = 1.0
+    monkeypatch.setattr(api, "search_limiter", api.ConcurrencyLimiter(2, 8, 0.2))
+
+    response, latency = await timed(client, "POST", "/search", json={"query": "怖い"})
+
+    assert response.status_code == 504
+    assert latency < 0.5
+
+
+async def test_wordcloud_traffic_does_not_delay_search(client):
+    wordclouds = [
+        asyncio.create_task(client.get(f"/wordcloud?isbn={WORDCLOUD_ISBN}"))
+        for _ in range(api.wordcloud_limiter.max_concurrency)
+    ]
+    await asyncio.sleep(SCRIPT_LATENCY / 10)
+
+    response, latency = await timed(client, "POST", "/search", json={"query": "怖い"})
+
+    assert response.status_code == 200
+    assert latency < SCRIPT_LATENCY * 1.5
+    for task in wordclouds:
+        assert (await task).status_code == 200
+
+
+async def test_cached_isbn_served_while_rakuten_limiter_is_full(client, stub_backends):
+    stub_backends["upstream"] = 0.5
+    limiter = api.rakuten_limiter
+    capacity = limiter.max_concurrency + limiter.max_queue
+    cached_isbn = "9784167732035"
+    api.rakuten_cache[cached_isbn] = {
+        "data": {"title": "Jの神話", "cached": False},
+        "timestamp": time.time() * 1000,
+    }
+
+    misses = [
+        asyncio.create_task(client.get(f"/rakuten-cache?isbn=978{i:010d}"))
+        for i in range(capacity)
+    ]
+    await asyncio.sleep(0.1)
+    assert limiter._pending == capacity
+
+    shed = await client.get("/rakuten-cache?isbn=9780000009999")
+    hit, latency = await timed(client, "GET", f"/rakuten-cache?isbn={cached_isbn}")
+
+    assert shed.status_code == 503
+    assert hit.status_code == 200
+    assert hit.json() == {"title": "Jの神話", "cached": True}
+    assert latency < 0.1
+    for task in misses:
+        assert (await task).status_code == 200
+
+
+class DripResponse:
+    """1バイトずつゆっくり本文を返す上流の偽物"""
+
+    def __init__(self, body: bytes, delay: float):
+        self._body = body
+        self._delay = delay
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def getcode(self):
+        return 200
+
+    def read1(self, size: int) -> bytes:
+        time.sleep(self._delay)
+        chunk, self._body = self._body[:1], self._body[1:]
+        return chunk
+
+
+def test_fetch_rakuten_json_caps_total_body_read_time(monkeypatch):
+    import urllib.request
+
+    body = b'{"Items": []}' * 100
+    monkeypatch.setattr(urllib.request, "urlopen", lambda url, timeout: DripResponse(body, 0.01))
+    monkeypatch.setattr(api, "UPSTREAM_TIMEOUT", 0.1)
+
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        api.fetch_rakuten_json("https://example.invalid/")
+    assert time.perf_counter() - start < 0.5